@@ -1,12 +1,9 @@
-import array
-import math
-import random
-
-from panda3d.core import Vec3, Point3
+import numpy as np
+from panda3d.core import Point3
 
 from .gradient_3d import GradientFlat
 from .terraced_terrain import FlatTerracedTerrainMixin
-from .themes.themes import themes_flat
+from .themes import themes_flat
 from .themes.flat_themes import Island
 from noise import SimplexNoise, PerlinNoise, CellularNoise
 from noise import Fractal2D
@@ -29,6 +26,8 @@ class FlatTerracedTerrain(FlatTerracedTerrainMixin, TriangleGenerator, Procedura
             persistence (float): At the end of each iteration, the amplitude is decreased by multiplying itself by persistence, less than 1.
             lacunarity (float): At the end of each iteration, the frequency is increased by multiplying itself by lacunarity, greater than 1.
             theme (str): one of "mountain", "snowmountain", "desert" and "island".
+            seed (int): Optional seed for the random offset; use it to reproduce a terrain.
+            workers (int): Spread noise sampling over this many processes when greater than 1.
     """
 
     def __init__(self,
@@ -42,14 +41,22 @@ class FlatTerracedTerrain(FlatTerracedTerrainMixin, TriangleGenerator, Procedura
                  lacunarity=2.52,
                  amplitude=1.0,
                  frequency=0.055,
-                 theme='mountain'
+                 theme='mountain',
+                 seed=None,
+                 workers=1
                  ):
         self.max_depth = max_depth
         self.center = Point3(0, 0, 0)
         self.noise_scale = noise_scale
         self.segs_c = segs_c
         self.radius = radius
+        self.uv_scale = 0.5 / radius
         self.theme = themes_flat.get(theme.lower())
+        self.rng = np.random.default_rng(seed)
+        self.workers = workers
+
+        self.apply_heights = \
+            self.apply_island_heights if self.theme == Island else self.apply_lowest_layer
 
         self.noise = Fractal2D(
             noise_gen=noise_gen,
@@ -102,68 +109,70 @@ class FlatTerracedTerrain(FlatTerracedTerrainMixin, TriangleGenerator, Procedura
             octaves=octaves,
             **kwargs)
 
-    def get_polygon_vertices(self, theta):
-        rad = math.radians(theta)
-        x = self.radius * math.cos(rad) + self.center.x
-        y = self.radius * math.sin(rad) + self.center.y
-
-        return Point3(x, y, 0)
-
     def generate_base_polygon(self):
         """Generate vertices for the polygon that will form the ground.
+            Returns:
+                np.ndarray: (segs_c, 2, 2) float32 array in which each row holds
+                the xy coordinates of two adjacent polygon vertices.
         """
-        deg = 360 / self.segs_c
-
-        for i in range(self.segs_c):
-            current_i = i + 1
+        theta = np.arange(1, self.segs_c + 1, dtype=np.float32) * (2 * np.pi / self.segs_c)
+        pts = np.empty((self.segs_c, 2), dtype=np.float32)
+        pts[:, 0] = self.radius * np.cos(theta) + self.center.x
+        pts[:, 1] = self.radius * np.sin(theta) + self.center.y
 
-            if (next_i := current_i + 1) > self.segs_c:
-                next_i = 1
-            pt1 = self.get_polygon_vertices(deg * current_i)
-            pt2 = self.get_polygon_vertices(deg * next_i)
-
-            yield (pt1, pt2)
+        return np.stack([pts, np.roll(pts, -1, axis=0)], axis=1)
 
     def create_terraced_terrain(self, vertex_cnt, vdata_values, prim_indices):
-        offset_x = random.uniform(-1000, 1000)
-        offset_y = random.uniform(-1000, 1000)
-
-        for p1, p2 in self.generate_base_polygon():
-            tri = [p1, p2, self.center]
+        offset = self.rng.uniform(-1000, 1000, 2).astype(np.float32)
 
-            for subdiv_face in self.subdivide(tri, self.max_depth):
-                vertices = []
+        base_tris = np.zeros((self.segs_c, 3, 3), dtype=np.float32)
+        base_tris[:, :2, :2] = self.generate_base_polygon()
+        base_tris[:, 2, :2] = (self.center.x, self.center.y)
+        faces = self.subdivide_triangles(base_tris, self.max_depth)
 
-                for vertex in subdiv_face:
-                    x = (vertex.x + offset_x) * self.noise_scale
-                    y = (vertex.y + offset_y) * self.noise_scale
-                    h = self.noise.noise_octaves(x, y)
+        # Adjacent triangles share their edge vertices bitwise exactly, so the
+        # noise is evaluated once per unique vertex and scattered back.
+        verts = faces.reshape(-1, 3)[:, :2]
+        unique, inverse = np.unique(verts, axis=0, return_inverse=True)
+        scaled = (unique + offset) * self.noise_scale
 
-                    if self.mask:
-                        grad = self.mask.get_gradient(vertex)
-                        h = 0.02 if grad >= h else h - grad
-                    else:
-                        if h <= self.theme.LAYER_01.threshold:
-                            h = self.theme.LAYER_01.threshold
+        heights = self.apply_heights(unique, self.sample_octaves(scaled))
+        heights = heights[inverse.reshape(-1)]
+        meandering = self.meandering_triangles
 
-                    vert = Vec3(vertex)
-                    vert.z = h
-                    vertices.append(vert)
+        positions = faces.copy()
+        positions.reshape(-1, 3)[:, 2] = heights
 
-                vertex_cnt += self.meandering_triangles(vertices, vertex_cnt, vdata_values, prim_indices)
+        for i in range(len(faces)):
+            vertex_cnt += meandering(positions[i], vertex_cnt, vdata_values, prim_indices)
 
         return vertex_cnt
 
+    def apply_island_heights(self, verts, heights):
+        """Lower the sampled heights toward the sea by the circular gradient."""
+        grads = self.mask.get_gradient_batch(verts)
+        return np.where(grads >= heights, np.float32(0.02), heights - grads)
+
+    def apply_lowest_layer(self, verts, heights):
+        """Clamp the sampled heights to the threshold of the lowest layer."""
+        return np.maximum(heights, self.theme.LAYER_01.threshold)
+
     def get_geom_node(self):
         self.mask = GradientFlat(self.radius, 2, Point3()) if self.theme == Island else None
-        vdata_values = array.array('f', [])
-        prim_indices = array.array('I', [])
+        vdata_values = []
+        prim_indices = []
         vertex_cnt = 0
 
         vertex_cnt += self.create_terraced_terrain(vertex_cnt, vdata_values, prim_indices)
 
+        # The number of terraces depends on the sampled heights, so the data is
+        # accumulated as per-primitive blocks and fused into one contiguous
+        # typed buffer at the end.
+        vdata = np.concatenate(vdata_values).reshape(-1)
+        indices = np.concatenate(prim_indices)
+
         # create a geom node.
         geom_node = self.create_geom_node(
-            vertex_cnt, vdata_values, prim_indices, self.__class__.__name__.lower())
+            vertex_cnt, vdata, indices, self.__class__.__name__.lower())
 
         return geom_node
\ No newline at end of file
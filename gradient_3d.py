@@ -1,6 +1,6 @@
 import math
 
-from panda3d.core import Point3
+import numpy as np
 
 
 class Gradient3D:
@@ -14,16 +14,28 @@ class Gradient3D:
     def __init__(self, max_length, gradient_size):
         self.max_length = max_length
         self.gradient_size = gradient_size
+        self.denom = 2 ** 0.5 * max_length / gradient_size
 
     def get_gradient(self, vert, center):
         norm = ((vert.x - center.x) ** 2 + (vert.y - center.y) ** 2 + (vert.z - center.z) ** 2) ** 0.5
-        dist_to_center = norm / (2 ** 0.5 * self.max_length / self.gradient_size)
+        dist_to_center = norm / self.denom
 
         if dist_to_center >= 1:
             return 1
 
         return 1 * dist_to_center
 
+    def get_gradient_batch(self, verts, centers):
+        """Compute the gradient values for all vertices at once.
+            Args:
+                verts (np.ndarray): Vertex coordinates; the shape is (N, 3).
+                centers (np.ndarray): Gradient centers; (N, 3) or a single (3, ) center.
+            Returns:
+                np.ndarray: (N, ) gradient values clamped to 1.
+        """
+        dists = np.linalg.norm(verts - centers, axis=1) / self.denom
+        return np.minimum(dists, 1.0, out=dists)
+
 
 class GradientFlat(Gradient3D):
 
@@ -34,6 +46,17 @@ class GradientFlat(Gradient3D):
     def get_gradient(self, vert):
         return super().get_gradient(vert, self.center)
 
+    def get_gradient_batch(self, verts):
+        """Compute the gradient values for all ground vertices at once.
+            Args:
+                verts (np.ndarray): (N, 2) xy coordinates on the ground plane.
+            Returns:
+                np.ndarray: (N, ) gradient values clamped to 1.
+        """
+        diffs = verts - np.array([self.center.x, self.center.y], dtype=np.float32)
+        dists = np.sqrt((diffs * diffs).sum(axis=1) + self.center.z ** 2) / self.denom
+        return np.minimum(dists, 1.0, out=dists)
+
 
 class GradientSphere(Gradient3D):
 
@@ -41,23 +64,39 @@ class GradientSphere(Gradient3D):
         super().__init__(max_length, gradient_size)
         self.vert_value = vert_value
         self.bound = bound
-        self.n_center = n_center * vert_value
-        self.s_center = s_center * vert_value
+        self.n_center = np.array(n_center, dtype=np.float32) * vert_value
+        self.s_center = np.array(s_center, dtype=np.float32) * vert_value
+        self.n_center_scaled = self.n_center
+        self.s_center_scaled = self.s_center
+        self.centers = {'n': self.n_center, 's': self.s_center}
+
+    def set_offset(self, offset, noise_scale):
+        """Precompute the gradient centers in scaled noise space once per
+           terrain generation, instead of rescaling them in the builder.
+            Args:
+                offset (np.ndarray): Random offset added to the sample coordinates.
+                noise_scale (float): Scale applied to the sample coordinates.
+        """
+        self.n_center_scaled = (self.n_center + offset) * noise_scale
+        self.s_center_scaled = (self.s_center + offset) * noise_scale
 
     def get_center(self, vert):
-        center = None
-
-        match self.north_or_south(vert):
-            case None:
-                return center
+        return self.centers.get(self.north_or_south(vert))
 
-            case 'n':
-                center = self.n_center
+    def get_centers(self, verts):
+        """Classify all vertices at once and look up their gradient centers.
+            Args:
+                verts (np.ndarray): Vertices on the cube surface; shape is (N, 3).
+            Returns:
+                labels (np.ndarray): int8 labels; 0 = no gradient, 1 = north, 2 = south.
+                centers (np.ndarray): (N, 3) gradient centers; NaN rows where the label is 0.
+        """
+        labels = self.classify(np.asarray(verts, dtype=np.float32))
+        centers = np.full((len(labels), 3), np.nan, dtype=np.float32)
+        centers[labels == 1] = self.n_center_scaled
+        centers[labels == 2] = self.s_center_scaled
 
-            case 's':
-                center = self.s_center
-
-        return center
+        return labels, centers
 
 
 class GradientSphereNESW(GradientSphere):
@@ -76,8 +115,8 @@ class GradientSphereNESW(GradientSphere):
         super().__init__(
             vert_value=vert_value,
             bound=bound,
-            n_center=Point3(1, 1, 1),
-            s_center=Point3(-1, -1, -1),
+            n_center=(1, 1, 1),
+            s_center=(-1, -1, -1),
             max_length=max_length,
             gradient_size=gradient_size)
 
@@ -114,6 +153,27 @@ class GradientSphereNESW(GradientSphere):
 
         return None
 
+    def classify(self, verts):
+        """Vectorized version of self.north_or_south; folds the six face checks
+           into boolean masks over all vertices at once.
+        """
+        x, y, z = verts[:, 0], verts[:, 1], verts[:, 2]
+        vv = self.vert_value
+        bound = self.bound
+
+        n_mask = ((x > -bound) & (np.abs(y - vv) <= 1e-5)) \
+            | ((np.abs(x - vv) <= 1e-5) & (y > -bound)) \
+            | ((x > -bound) & (y > -bound) & (np.abs(z - vv) <= 1e-5))
+
+        s_mask = ((x < bound) & (np.abs(y + vv) <= 1e-5)) \
+            | ((np.abs(x + vv) <= 1e-5) & (y < bound)) \
+            | ((x < bound) & (y < bound) & (np.abs(z + vv) <= 1e-5))
+
+        labels = np.zeros(len(verts), dtype=np.int8)
+        labels[s_mask] = 2
+        labels[n_mask] = 1
+        return labels
+
 
 class GradientSphereNWSE(GradientSphere):
     """A class to generate a circular gradient centered on the bottom-right
@@ -131,8 +191,8 @@ class GradientSphereNWSE(GradientSphere):
         super().__init__(
             vert_value=vert_value,
             bound=bound,
-            n_center=Point3(-1, 1, 1),
-            s_center=Point3(1, -1, -1),
+            n_center=(-1, 1, 1),
+            s_center=(1, -1, -1),
             max_length=max_length,
             gradient_size=gradient_size)
 
@@ -167,4 +227,25 @@ class GradientSphereNWSE(GradientSphere):
                 math.isclose(vert.z, -self.vert_value, abs_tol=1e-5):
             return 's'
 
-        return None
\ No newline at end of file
+        return None
+
+    def classify(self, verts):
+        """Vectorized version of self.north_or_south; folds the six face checks
+           into boolean masks over all vertices at once.
+        """
+        x, y, z = verts[:, 0], verts[:, 1], verts[:, 2]
+        vv = self.vert_value
+        bound = self.bound
+
+        n_mask = ((x < bound) & (np.abs(y - vv) <= 1e-5)) \
+            | ((np.abs(x + vv) <= 1e-5) & (y > -bound)) \
+            | ((x < bound) & (y > -bound) & (np.abs(z - vv) <= 1e-5))
+
+        s_mask = ((x > -bound) & (np.abs(y + vv) <= 1e-5)) \
+            | ((np.abs(x - vv) <= 1e-5) & (y < bound)) \
+            | ((x > -bound) & (y < bound) & (np.abs(z + vv) <= 1e-5))
+
+        labels = np.zeros(len(verts), dtype=np.int8)
+        labels[s_mask] = 2
+        labels[n_mask] = 1
+        return labels
\ No newline at end of file
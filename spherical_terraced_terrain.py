@@ -1,12 +1,8 @@
-import array
-import random
-from functools import reduce
-
-from panda3d.core import Vec3, Point3
+import numpy as np
 
 from .gradient_3d import GradientSphereNESW, GradientSphereNWSE
 from .terraced_terrain import SphericalTerracedTerrainMixin
-from .themes.themes import themes_sphere
+from .themes import themes_sphere
 from .themes.sphere_themes import Island
 from noise import SimplexNoise, PerlinNoise, CellularNoise, Fractal3D
 from shapes.polyhedron import SphericalPolyhedron
@@ -26,6 +22,8 @@ class SphericalTerracedTerrain(SphericalTerracedTerrainMixin, SphericalPolyhedro
             persistence (float): At the end of each iteration, the amplitude is decreased by multiplying itself by persistence, less than 1.
             lacunarity (float): At the end of each iteration, the frequency is increased by multiplying itself by lacunarity, greater than 1.
             theme (str): one of "mountain", "snow" and "desert".
+            seed (int): Optional seed for the random offset; use it to reproduce a terrain.
+            workers (int): Spread noise sampling over this many processes when greater than 1.
     """
 
     vert_value = 0.57735027
@@ -48,11 +46,18 @@ class SphericalTerracedTerrain(SphericalTerracedTerrainMixin, SphericalPolyhedro
                  frequency=0.055,
                  persistence=0.375,
                  lacunarity=2.52,
-                 theme='mountain'
+                 theme='mountain',
+                 seed=None,
+                 workers=1
                  ):
         super().__init__(max_depth, terrain_scale)
         self.noise_scale = noise_scale
         self.theme = themes_sphere.get(theme.lower())
+        self.rng = np.random.default_rng(seed)
+        self.workers = workers
+
+        self.apply_heights = \
+            self.apply_island_heights if self.theme == Island else self.apply_lowest_layer
 
         self.noise = Fractal3D(
             noise_gen=noise_gen,
@@ -102,39 +107,51 @@ class SphericalTerracedTerrain(SphericalTerracedTerrainMixin, SphericalPolyhedro
             **kwargs)
 
     def create_terraced_terrain(self, vertex_cnt, vdata_values, prim_indices):
-        offset = Vec3(*[random.uniform(-1000, 1000) for _ in range(3)])
+        offset = self.rng.uniform(-1000, 1000, 3).astype(np.float32)
+
+        faces = self.subdivide_triangles(self.generate_triangles(), self.max_depth)
+
+        # Adjacent triangles share their edge vertices bitwise exactly, so the
+        # noise is evaluated once per unique vertex and scattered back.
+        verts = faces.reshape(-1, 3)
+        unique, inverse = np.unique(verts, axis=0, return_inverse=True)
+        scaled = (unique + offset) * self.noise_scale
 
         if self.mask:
-            self.mask.n_center = (self.mask.n_center + offset) * self.noise_scale
-            self.mask.s_center = (self.mask.s_center + offset) * self.noise_scale
-
-        for subdiv_face in self.generate_divided_tri():
-            vertices = []
-            for vertex in subdiv_face:
-                scaled_vert = (vertex + offset) * self.noise_scale
-                h = self.noise.noise_octaves(*scaled_vert)
-
-                if self.mask:
-                    if (center := self.mask.get_center(vertex)) and \
-                            (grad := self.mask.get_gradient(scaled_vert, center)) < h - 0.5:
-                        h -= grad
-                    else:
-                        h = 0.52
-                else:
-                    if h < self.theme.LAYER_01.threshold:
-                        h = self.theme.LAYER_01.threshold
-
-                normalized_vert = vertex.normalized()
-                vert = normalized_vert * (1 + h)
-                vertices.append(vert)
-
-            vertex_cnt += self.meandering_triangles(
-                vertices, vertex_cnt, vdata_values, prim_indices)
+            self.mask.set_offset(offset, self.noise_scale)
+
+        heights = self.apply_heights(unique, scaled, self.sample_octaves(scaled))
+        heights = heights[inverse.reshape(-1)]
+        meandering = self.meandering_triangles
+
+        # Displace the unit sphere by the final heights in one broadcast,
+        # instead of normalizing and scaling a Vec3 for every vertex.
+        normals = verts / np.sqrt((verts * verts).sum(axis=1))[:, None]
+        positions = normals * (1 + heights)[:, None]
+
+        for i in range(len(faces)):
+            vertex_cnt += meandering(
+                positions[i * 3:i * 3 + 3], vertex_cnt, vdata_values, prim_indices)
 
         return vertex_cnt
 
+    def apply_island_heights(self, verts, scaled, heights):
+        """Lower the sampled heights toward the sea by the circular gradients.
+           Unlabeled vertices have NaN centers, so their gradients turn NaN
+           and fall into the sea-level branch.
+        """
+        labels, centers = self.mask.get_centers(verts)
+        grads = self.mask.get_gradient_batch(scaled, centers)
+
+        return np.where(
+            (labels != 0) & (grads < heights - 0.5), heights - grads, np.float32(0.52))
+
+    def apply_lowest_layer(self, verts, scaled, heights):
+        """Clamp the sampled heights to the threshold of the lowest layer."""
+        return np.maximum(heights, self.theme.LAYER_01.threshold)
+
     def create_mask(self):
-        mask = GradientSphereNESW if random.random() >= 0.5 else GradientSphereNWSE
+        mask = GradientSphereNESW if self.rng.random() >= 0.5 else GradientSphereNWSE
 
         return mask(
             vert_value=self.vert_value,
@@ -142,24 +159,37 @@ class SphericalTerracedTerrain(SphericalTerracedTerrainMixin, SphericalPolyhedro
         )
 
     def generate_triangles(self):
-        for face in self.cube_faces:
-            face_pts = [Point3(*pts) * self.vert_value for pts in face]
-            center = reduce(lambda x, y: x + y, face_pts, Point3()) / 4
+        """Split each cube face into the four triangles formed by two adjacent
+           face vertices and the face center.
+            Returns:
+                np.ndarray: (24, 3, 3) float32 array of triangle vertices.
+        """
+        faces = np.array(self.cube_faces, dtype=np.float32) * self.vert_value
+        centers = faces.mean(axis=1)
 
-            for p1, p2 in zip(face_pts, face_pts[1:] + face_pts[:1]):
-                tri = [p1, p2, center]
-                yield tri
+        tris = np.stack(
+            [faces, np.roll(faces, -1, axis=1), np.broadcast_to(centers[:, None], faces.shape)],
+            axis=2)
+
+        return tris.reshape(-1, 3, 3)
 
     def get_geom_node(self):
         self.mask = self.create_mask() if self.theme == Island else None
 
-        vdata_values = array.array('f', [])
-        prim_indices = array.array('I', [])
+        vdata_values = []
+        prim_indices = []
         vertex_cnt = 0
 
         vertex_cnt += self.create_terraced_terrain(vertex_cnt, vdata_values, prim_indices)
+
+        # The number of terraces depends on the sampled heights, so the data is
+        # accumulated as per-primitive blocks and fused into one contiguous
+        # typed buffer at the end.
+        vdata = np.concatenate(vdata_values).reshape(-1)
+        indices = np.concatenate(prim_indices)
+
         # create a geom node.
         geom_node = self.create_geom_node(
-            vertex_cnt, vdata_values, prim_indices, self.__class__.__name__.lower())
+            vertex_cnt, vdata, indices, self.__class__.__name__.lower())
 
         return geom_node
\ No newline at end of file
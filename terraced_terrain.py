@@ -1,126 +1,226 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import numpy as np
 
-from panda3d.core import Vec3, Point3
+from panda3d.core import Vec3
+
+
+def _sample_octaves_chunk(noise_octaves, points):
+    """Evaluate a chunk of noise samples; kept at module level so that it can
+       be pickled to the worker processes.
+    """
+    return [noise_octaves(*pt) for pt in points]
 
 
 class TerracedTerrainMixin:
 
-    def meandering_triangles(self, vertices, index_offset, vdata_values, prim_indices):
-        vertex_cnt = 0
+    # Cyclic rotations and above-plane counts for meandering_triangles,
+    # indexed by the 3-bit mask (v1 above) << 2 | (v2 above) << 1 | (v3 above).
+    # The rotation puts the point above the plane last (one point above),
+    # or the point below it (two points above).
+    PERM_TABLE = (
+        ([0, 1, 2], 0),
+        ([0, 1, 2], 1),
+        ([2, 0, 1], 1),
+        ([1, 2, 0], 2),
+        ([1, 2, 0], 1),
+        ([2, 0, 1], 2),
+        ([0, 1, 2], 2),
+        ([0, 1, 2], 3),
+    )
+
+    # Index patterns of the primitives, relative to their first vertex.
+    TRI_PATTERN = np.array([0, 1, 2], dtype=np.uint32)
+    ROOF_PATTERN = np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32)
+    WALL_PATTERN = np.array([0, 1, 3, 1, 2, 3], dtype=np.uint32)
+
+    def subdivide_triangles(self, tris, max_depth):
+        """Subdivide triangles into four smaller ones, level by level.
+            Args:
+                tris (np.ndarray): Triangle vertices; the shape is (T, 3, 3).
+                max_depth (int): The number of subdivision levels.
+            Returns:
+                np.ndarray: (T * 4 ** max_depth, 3, 3) float32 array.
+        """
+        tris = np.asarray(tris, dtype=np.float32)
 
-        # Each point's heights above "sea level".
-        v1, v2, v3 = vertices
-        h1, h2, h3 = self.get_height(v1, v2, v3)
+        for _ in range(max_depth):
+            a, b, c = tris[:, 0], tris[:, 1], tris[:, 2]
+            m01 = (a + b) * 0.5
+            m12 = (b + c) * 0.5
+            m20 = (c + a) * 0.5
 
-        li = [int(h_ * 10) for h_ in (h1, h2, h3)]
-        h_min = np.floor(min(li))
-        h_max = np.floor(max(li))
+            tris = np.concatenate([
+                np.stack([a, m01, m20], axis=1),
+                np.stack([m01, b, m12], axis=1),
+                np.stack([m20, m12, c], axis=1),
+                np.stack([m01, m12, m20], axis=1),
+            ])
 
-        for h in np.arange(h_min, h_max + 1, 0.5):
-            h *= 0.1
-            points_above = 0
+        return tris
 
-            # Indicate triangles above the plane.
-            match [val for val in [h1, h2, h3] if val > h]:
+    def sample_octaves(self, points):
+        """Evaluate fractal noise for every row of points in one batch.
+            Args:
+                points (np.ndarray):
+                    Scaled sample coordinates; the shape is (N, 2) or (N, 3).
+        """
+        noise_octaves = self.noise.noise_octaves
+
+        # Feed whole coordinate columns to the noise implementation first; a
+        # vectorized build (ufunc or jit compiled) evaluates them in one call.
+        try:
+            heights = np.asarray(noise_octaves(*points.T), dtype=np.float32)
+            if heights.shape == (len(points), ):
+                return heights
+        except (TypeError, ValueError):
+            pass
+
+        # The samples are independent, so they can be spread over worker
+        # processes in chunks when the builder was given extra workers.
+        workers = getattr(self, 'workers', 1)
+
+        if workers and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunks = executor.map(
+                    partial(_sample_octaves_chunk, noise_octaves),
+                    np.array_split(points, workers))
+
+            return np.concatenate(
+                [np.asarray(chunk, dtype=np.float32) for chunk in chunks])
+
+        # Fall back to the per-sample kernel.
+        return np.fromiter(
+            (noise_octaves(*pt) for pt in points), dtype=np.float32, count=len(points))
 
-                case [x]:
-                    points_above = 1
-                    if x == h1:
-                        v1, v2, v3 = v2, v3, v1
-                    elif x == h2:
-                        v1, v2, v3 = v3, v1, v2
+    def meandering_triangles(self, vertices, index_offset, vdata_values, prim_indices):
+        vertex_cnt = 0
 
-                case [x, y]:
-                    points_above = 2
-                    if x == h2 and y == h3:
-                        v1, v2, v3 = v2, v3, v1
-                    elif x == h1 and y == h3:
-                        v1, v2, v3 = v3, v1, v2
+        # Each point's heights above "sea level".
+        base = vertices
+        heights = np.array(self.get_height(*base))
+        hs = heights.tolist()
+        h1, h2, h3 = hs
+
+        # Pick the lowest and highest height with direct compares; no list
+        # just to call min/max over three values.
+        lo = h1 if h1 < h2 else h2
+        lo = lo if lo < h3 else h3
+        hi = h1 if h1 > h2 else h2
+        hi = hi if hi > h3 else h3
+
+        h_min = int(lo * 10)
+        h_max = int(hi * 10)
+
+        # One reciprocal per triangle; the spherical projections scale by
+        # h * inv_length instead of dividing every point again per plane.
+        inv_lengths = 1.0 / heights
+
+        # Bind the helpers once; attribute lookups add up over the planes.
+        perm_table = self.PERM_TABLE
+        get_color = self.get_color
+        get_current_plane = self.get_current_plane
+        get_plane_below = self.get_plane_below
+        lerp = self.lerp
+        add_triangle = self.add_triangle
+        add_step_roof = self.add_step_roof
+        add_step_wall = self.add_step_wall
+
+        # Walk the planes as doubled terrace ints; k * 0.05 merges the
+        # 0.1 terrace scale and the 0.5 step of the original arange.
+        for k in range(h_min * 2, (h_max + 1) * 2):
+            h = k * 0.05
+            perm, points_above = perm_table[(h1 > h) << 2 | (h2 > h) << 1 | (h3 > h)]
+
+            # Nothing pokes through this plane; skip it before any projection work.
+            if points_above == 0:
+                continue
 
-                case [_, _, _]:
-                    points_above = 3
+            tri = base[perm]
 
             # For each point of the triangle, need its projections to the current plane and the plane below.
             # Just set its vertical component to the plane's height.
 
-            # Since swapped values of the points, let's find their heights again
-            h1, h2, h3 = self.get_height(v1, v2, v3)
+            # The heights are already known, so permute them along with the points.
+            hp1, hp2, hp3 = hs[perm[0]], hs[perm[1]], hs[perm[2]]
+            inv = inv_lengths[perm]
             # current plane
-            v1_c, v2_c, v3_c = self.get_current_plane((v1, v2, v3), (h1, h2, h3), h)
+            current = get_current_plane(tri, inv, h)
 
             # Generate mesh polygons for each of the three cases.
             if points_above == 3:
                 # add one triangle.
-                tri = [v1_c, v2_c, v3_c]
-                self.add_triangle(tri, h, index_offset, vdata_values, prim_indices)
+                add_triangle(
+                    current, get_color(h), index_offset, vdata_values, prim_indices)
                 index_offset += 3
                 vertex_cnt += 3
                 continue
 
+            v1_c, v2_c, v3_c = current
+
             # The plane below; used to make vertical walls between planes.
-            v1_b, v2_b, v3_b = self.get_plane_below((v1, v2, v3), (h1, h2, h3), h)
+            v1_b, v2_b, v3_b = get_plane_below(tri, inv, h)
 
             # Find locations of new points that are located on the sides of the triangle's projections,
             # by interpolating between vectors based on their heights.
 
             # Interpolation value for v1 and v3
-            t1 = 0 if (denom := h1 - h3) == 0 else (h1 - h) / denom
-            v1_c_n = self.lerp(v1_c, v3_c, t1)
-            v1_b_n = self.lerp(v1_b, v3_b, t1)
+            t1 = 0 if (denom := hp1 - hp3) == 0 else (hp1 - h) / denom
+            v1_c_n = lerp(v1_c, v3_c, t1)
+            v1_b_n = lerp(v1_b, v3_b, t1)
 
             # Interpolation value for v2 and v3
-            t2 = 0 if (denom := h2 - h3) == 0 else (h2 - h) / denom
-            v2_c_n = self.lerp(v2_c, v3_c, t2)
-            v2_b_n = self.lerp(v2_b, v3_b, t2)
+            t2 = 0 if (denom := hp2 - hp3) == 0 else (hp2 - h) / denom
+            v2_c_n = lerp(v2_c, v3_c, t2)
+            v2_b_n = lerp(v2_b, v3_b, t2)
+
+            # The roof and wall of one step share their color, so resolve the
+            # theme color once per plane.
+            color = get_color(h)
 
             if points_above == 2:
                 # Add roof part of the step
-                quad = [v1_c, v2_c, v2_c_n, v1_c_n]
-                self.add_step_roof(quad, h, index_offset, vdata_values, prim_indices)
+                quad = np.stack([v1_c, v2_c, v2_c_n, v1_c_n])
+                add_step_roof(quad, color, index_offset, vdata_values, prim_indices)
                 index_offset += 4
 
                 # Add wall part of the step.
-                quad = [v1_c_n, v2_c_n, v2_b_n, v1_b_n]
-                self.add_step_wall(quad, h, index_offset, vdata_values, prim_indices)
+                quad = np.stack([v1_c_n, v2_c_n, v2_b_n, v1_b_n])
+                add_step_wall(quad, color, index_offset, vdata_values, prim_indices)
                 index_offset += 4
 
                 vertex_cnt += 8
 
             elif points_above == 1:
                 # Add roof part of the step.
-                tri = [v3_c, v1_c_n, v2_c_n]
-                self.add_triangle(tri, h, index_offset, vdata_values, prim_indices)
+                tri = np.stack([v3_c, v1_c_n, v2_c_n])
+                add_triangle(tri, color, index_offset, vdata_values, prim_indices)
                 index_offset += 3
 
                 # Add wall part of the step.
-                quad = [v2_c_n, v1_c_n, v1_b_n, v2_b_n]
-                self.add_step_wall(quad, h, index_offset, vdata_values, prim_indices)
+                quad = np.stack([v2_c_n, v1_c_n, v1_b_n, v2_b_n])
+                add_step_wall(quad, color, index_offset, vdata_values, prim_indices)
                 index_offset += 4
 
                 vertex_cnt += 7
 
         return vertex_cnt
 
-    def add_triangle(self, tri_vertices, color_thresh, index_offset, vdata_values, prim_indices):
-        self.create_triangle_vertices(tri_vertices, color_thresh, vdata_values)
+    def add_triangle(self, tri_vertices, color, index_offset, vdata_values, prim_indices):
+        self.create_triangle_vertices(tri_vertices, color, vdata_values)
 
-        prim_indices.extend([index_offset, index_offset + 1, index_offset + 2])
+        prim_indices.append(index_offset + self.TRI_PATTERN)
 
-    def add_step_roof(self, quad_vertices, color_thresh, index_offset, vdata_values, prim_indices):
-        self.create_quad_vertices(quad_vertices, color_thresh, vdata_values, wall=False)
+    def add_step_roof(self, quad_vertices, color, index_offset, vdata_values, prim_indices):
+        self.create_quad_vertices(quad_vertices, color, vdata_values, wall=False)
 
-        prim_indices.extend([
-            *(index_offset, index_offset + 1, index_offset + 2),
-            *(index_offset + 2, index_offset + 3, index_offset)
-        ])
+        prim_indices.append(index_offset + self.ROOF_PATTERN)
 
-    def add_step_wall(self, quad_vertices, color_thresh, index_offset, vdata_values, prim_indices):
-        self.create_quad_vertices(quad_vertices, color_thresh, vdata_values, wall=True)
+    def add_step_wall(self, quad_vertices, color, index_offset, vdata_values, prim_indices):
+        self.create_quad_vertices(quad_vertices, color, vdata_values, wall=True)
 
-        prim_indices.extend([
-            *(index_offset, index_offset + 1, index_offset + 3),
-            *(index_offset + 1, index_offset + 2, index_offset + 3)
-        ])
+        prim_indices.append(index_offset + self.WALL_PATTERN)
 
     def lerp(self, start, end, t):
         """Args
@@ -128,7 +228,11 @@ class TerracedTerrainMixin:
             end: end point
             t: Interpolation rate; between 0.0 and 1.0
         """
-        return start + (end - start) * t
+        sx, sy, sz = start
+        ex, ey, ez = end
+        # Interpolate component-wise; cheaper than the array operators for
+        # a single point.
+        return sx + (ex - sx) * t, sy + (ey - sy) * t, sz + (ez - sz) * t
 
     def calculate_quad_normal(self, vertices):
         """The four vertices of the quadrilateral lie on a single plane.
@@ -136,15 +240,28 @@ class TerracedTerrainMixin:
            the quadrilateral was divided into two triangles, and the normal
            for each triangle were calculated and averaged.
         """
-        v1_0 = vertices[1] - vertices[0]
-        v2_0 = vertices[3] - vertices[0]
+        (x0, y0, z0), (x1, y1, z1), (x2, y2, z2), (x3, y3, z3) = vertices
+
+        # Edge vectors of the two triangles.
+        ax, ay, az = x1 - x0, y1 - y0, z1 - z0
+        bx, by, bz = x3 - x0, y3 - y0, z3 - z0
+        cx, cy, cz = x3 - x2, y3 - y2, z3 - z2
+        dx, dy, dz = x1 - x2, y1 - y2, z1 - z2
 
-        v1_2 = vertices[3] - vertices[2]
-        v2_2 = vertices[1] - vertices[2]
+        # b x a + d x c, averaged over the two triangles.
+        nx = (by * az - bz * ay + dy * cz - dz * cy) / 2
+        ny = (bz * ax - bx * az + dz * cx - dx * cz) / 2
+        nz = (bx * ay - by * ax + dx * cy - dy * cx) / 2
 
-        total = v2_0.cross(v1_0) + v2_2.cross(v1_2)
-        normal = (total / 2).normalized()
-        return normal
+        sq = nx * nx + ny * ny + nz * nz
+
+        # A wall quad can collapse when a height lands exactly on a plane;
+        # return a zero normal for it, like Vec3.normalized() did.
+        if sq == 0:
+            return 0.0, 0.0, 0.0
+
+        inv = 1 / sq ** 0.5
+        return nx * inv, ny * inv, nz * inv
 
 
 class FlatTerracedTerrainMixin(TerracedTerrainMixin):
@@ -152,13 +269,17 @@ class FlatTerracedTerrainMixin(TerracedTerrainMixin):
     """
 
     def get_height(self, v1, v2, v3):
-        return v1.z, v2.z, v3.z
+        return v1[2], v2[2], v3[2]
 
     def get_current_plane(self, vertices, _, h):
-        return [Point3(v.x, v.y, h) for v in vertices]
+        plane = vertices.copy()
+        plane[:, 2] = h
+        return plane
 
     def get_plane_below(self, vertices, _, h):
-        return [Point3(v.x, v.y, h - 0.05) for v in vertices]
+        plane = vertices.copy()
+        plane[:, 2] = h - 0.05
+        return plane
 
     def get_color(self, thresh):
         return self.theme.color(thresh)
@@ -168,21 +289,30 @@ class FlatTerracedTerrainMixin(TerracedTerrainMixin):
         v = 0.5 + y / self.radius * 0.5
         return u, v
 
-    def create_triangle_vertices(self, vertices, color_thresh, vdata_values):
-        color = self.get_color(color_thresh)
-        normal = Vec3(0, 0, 1)
+    def calc_uv_batch(self, xy):
+        """Compute the uv coordinates for all vertices of a primitive at once.
+            Args:
+                xy (np.ndarray): (N, 2) xy coordinates on the ground plane.
+        """
+        return 0.5 + xy * self.uv_scale
+
+    def create_triangle_vertices(self, vertices, color, vdata_values):
+        block = np.empty((3, 12), dtype=np.float32)
+        block[:, 0:3] = vertices
+        block[:, 3:7] = color
+        block[:, 7:10] = (0, 0, 1)
+        block[:, 10:12] = self.calc_uv_batch(vertices[:, 0:2])
 
-        for vertex in vertices:
-            uv = self.calc_uv(vertex.x, vertex.y)
-            vdata_values.extend([*vertex, *color, *normal, *uv])
+        vdata_values.append(block)
 
-    def create_quad_vertices(self, vertices, color_thresh, vdata_values, wall=False):
-        color = self.get_color(color_thresh)
-        normal = self.calculate_quad_normal(vertices) if wall else Vec3(0, 0, 1)
+    def create_quad_vertices(self, vertices, color, vdata_values, wall=False):
+        block = np.empty((4, 12), dtype=np.float32)
+        block[:, 0:3] = vertices
+        block[:, 3:7] = color
+        block[:, 7:10] = self.calculate_quad_normal(vertices) if wall else (0, 0, 1)
+        block[:, 10:12] = self.calc_uv_batch(vertices[:, 0:2])
 
-        for vertex in vertices:
-            uv = self.calc_uv(vertex.x, vertex.y)
-            vdata_values.extend([*vertex, *color, *normal, *uv])
+        vdata_values.append(block)
 
 
 class SphericalTerracedTerrainMixin(TerracedTerrainMixin):
@@ -190,41 +320,44 @@ class SphericalTerracedTerrainMixin(TerracedTerrainMixin):
     """
 
     def get_height(self, v1, v2, v3):
-        return v1.length(), v2.length(), v3.length()
+        return (v1 @ v1) ** 0.5, (v2 @ v2) ** 0.5, (v3 @ v3) ** 0.5
 
-    def get_current_plane(self, vertices, vector_lengths, h):
-        return [(v / l) * h for v, l in zip(vertices, vector_lengths)]
+    def get_current_plane(self, vertices, inv_lengths, h):
+        return vertices * (h * inv_lengths)[:, None]
 
-    def get_plane_below(self, vertices, vector_lengths, h):
-        return [(v / l) * (h - 0.05) for v, l in zip(vertices, vector_lengths)]
+    def get_plane_below(self, vertices, inv_lengths, h):
+        return vertices * ((h - 0.05) * inv_lengths)[:, None]
 
     def get_color(self, thresh):
         return self.theme.color(thresh - 1)
 
-    def create_triangle_vertices(self, vertices, color_thresh, vdata_values):
-        uvs = [self.calc_uv(vert.normalized()) for vert in vertices]
+    def create_triangle_vertices(self, vertices, color, vdata_values):
+        normals = vertices / np.linalg.norm(vertices, axis=1)[:, None]
+        calc_uv = self.calc_uv
+        uvs = [calc_uv(Vec3(*n)) for n in normals]
         self.fix_uv(uvs)
-        color = self.get_color(color_thresh)
-
-        for vert, uv in zip(vertices, uvs):
-            vertex = vert * self.scale
-            normal = vert.normalized()
 
-            vdata_values.extend([*vertex, *color, *normal, *uv])
+        block = np.empty((3, 12), dtype=np.float32)
+        block[:, 0:3] = vertices * self.scale
+        block[:, 3:7] = color
+        block[:, 7:10] = normals
+        block[:, 10:12] = [(uv.x, uv.y) for uv in uvs]
 
-    def create_quad_vertices(self, vertices, color_thresh, vdata_values, wall=False):
-        color = self.get_color(color_thresh)
-        normal = self.calculate_quad_normal(vertices) if wall else None
+        vdata_values.append(block)
 
-        uvs = [self.calc_uv(vert.normalized()) for vert in vertices]
+    def create_quad_vertices(self, vertices, color, vdata_values, wall=False):
+        normals = vertices / np.linalg.norm(vertices, axis=1)[:, None]
+        calc_uv = self.calc_uv
+        uvs = [calc_uv(Vec3(*n)) for n in normals]
         self.fix_uv(uvs)
 
-        for vert, uv in zip(vertices, uvs):
-            if not wall:
-                normal = vert.normalized()
+        block = np.empty((4, 12), dtype=np.float32)
+        block[:, 0:3] = vertices * self.scale
+        block[:, 3:7] = color
+        block[:, 7:10] = self.calculate_quad_normal(vertices) if wall else normals
+        block[:, 10:12] = [(uv.x, uv.y) for uv in uvs]
 
-            vertex = vert * self.scale
-            vdata_values.extend([*vertex, *color, *normal, *uv])
+        vdata_values.append(block)
 
     def fix_uv(self, uvs):
         """recalculate the UV to prevent ziggzagging distortion effects.
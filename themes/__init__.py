@@ -0,0 +1 @@
+from .themes import Theme, themes_flat, themes_sphere
@@ -1,5 +1,7 @@
 from enum import Enum
 
+import numpy as np
+
 
 themes_sphere = {}
 themes_flat = {}
@@ -8,7 +10,8 @@ themes_flat = {}
 class Theme(Enum):
 
     def __init__(self, rgba, threshold):
-        self.rgba = [round(v / 255, 2) for v in rgba]
+        self.rgba = np.array([round(v / 255, 2) for v in rgba], dtype=np.float32)
+        self.rgba.flags.writeable = False
         self.threshold = threshold
 
     def __init_subclass__(cls):
@@ -20,15 +23,18 @@ class Theme(Enum):
 
     @classmethod
     def color(cls, z):
-        if z <= cls.LAYER_01.threshold:
-            return cls.LAYER_01.rgba
-        if z <= cls.LAYER_02.threshold:
-            return cls.LAYER_02.rgba
-        if z <= cls.LAYER_03.threshold:
-            return cls.LAYER_03.rgba
-        if z <= cls.LAYER_04.threshold:
-            return cls.LAYER_04.rgba
-        if z <= cls.LAYER_05.threshold:
-            return cls.LAYER_05.rgba
-
-        return cls.LAYER_06.rgba
\ No newline at end of file
+        """Build the threshold lookup on the first call and rebind it as a
+           closure, so later calls go straight to searchsorted without any
+           enum attribute lookups. This cannot happen in __init_subclass__
+           because the enum members do not exist yet at that point.
+        """
+        layers = list(cls)
+        thresholds = np.array([layer.threshold for layer in layers[:-1]])
+        rgbas = [layer.rgba for layer in layers]
+        searchsorted = thresholds.searchsorted
+
+        def color(z):
+            return rgbas[searchsorted(z)]
+
+        cls.color = color
+        return color(z)
\ No newline at end of file